@@ -6,7 +6,7 @@ Usando FastAPI
 Fecha: 2025
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, BackgroundTasks
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -14,17 +14,38 @@ from typing import Optional, List
 import os
 import tempfile
 import shutil
+import subprocess
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import zipfile
 import io
 import uuid
+import hashlib
+import logging
+import mmap
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
 
 # Importar las clases del código original
-from reportlab.pdfgen import canvas
-from reportlab.lib.colors import black, white
-import PyPDF2
-from PyPDF2 import PdfWriter, PdfReader
+from pypdf import PdfWriter, PdfReader
+from pypdf.errors import PyPdfError
+from pypdf.generic import (
+    ArrayObject, BooleanObject, DecodedStreamObject, DictionaryObject, FloatObject,
+    IndirectObject, NameObject, NumberObject, TextStringObject
+)
+
+# pikepdf (qpdf en C++) es opcional: si está instalado se usa en lugar de pypdf
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+# Errores esperables con PDFs dañados o inaccesibles (pypdf da ValueError con
+# offsets fuera de rango): se registran en una línea; cualquier otro, con su traza
+PDF_ERRORS = (OSError, ValueError, PyPdfError) + ((pikepdf.PdfError,) if pikepdf is not None else ())
+
+logger = logging.getLogger(__name__)
 
 # Inicializar FastAPI
 app = FastAPI(
@@ -38,8 +59,9 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # En producción, especifica dominios específicos
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE"],  # Solo los métodos que expone la API
+    allow_headers=["content-type"],
+    max_age=3600,  # Cachear el preflight en el navegador
 )
 
 # Modelos Pydantic para requests/responses
@@ -65,8 +87,195 @@ class StatusResponse(BaseModel):
     timestamp: str
 
 # Directorio temporal para archivos
-TEMP_DIR = Path("temp_files")
-TEMP_DIR.mkdir(exist_ok=True)
+# (en tmpfs si hay espacio suficiente, para no tocar disco). PDF_API_TEMP_DIR fija
+# el directorio base; se usa un subdirectorio propio porque se vacía al arrancar
+SHM_DIR = Path("/dev/shm")
+SHM_MIN_SIZE = 1 << 30
+
+def _default_temp_dir() -> Path:
+    if os.environ.get("PDF_API_TEMP_DIR"):
+        return Path(os.environ["PDF_API_TEMP_DIR"]) / "pdf_api"
+    try:
+        if SHM_DIR.is_dir() and shutil.disk_usage(SHM_DIR).total >= SHM_MIN_SIZE:
+            return SHM_DIR / "pdf_api"
+    except OSError:
+        pass
+    return Path("temp_files")
+
+TEMP_DIR = _default_temp_dir()
+TEMP_DIR.mkdir(parents=True, exist_ok=True)
+
+# Tamaño de bloque para copiar uploads a disco
+COPY_CHUNK_SIZE = 1 << 20
+# Buffer de escritura de los PDFs generados en disco
+OUTPUT_BUFFER_SIZE = 8 << 20
+
+# Buffer en memoria por bloques (evita realocar y copiar todo al crecer)
+class SegmentedBytesIO(io.RawIOBase):
+    def __init__(self, block_size=1 << 20):
+        super().__init__()
+        self._block_size = block_size
+        self._blocks: list[bytearray] = []
+        self._size = 0
+        self._pos = 0
+    
+    def readable(self):
+        return True
+    
+    def writable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def tell(self):
+        return self._pos
+    
+    @property
+    def size(self) -> int:
+        return self._size
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"whence inválido: {whence}")
+        if pos < 0:
+            raise ValueError(f"Posición negativa: {pos}")
+        self._pos = pos
+        return pos
+    
+    def write(self, b):
+        data = memoryview(b).cast('B')
+        if not data:
+            return 0
+        if self._pos > self._size:
+            # Rellenar con ceros el hueco dejado por un seek más allá del final
+            gap = self._pos - self._size
+            self._pos = self._size
+            self.write(bytes(gap))
+        written = 0
+        while written < len(data):
+            index, start = divmod(self._pos, self._block_size)
+            if index == len(self._blocks):
+                self._blocks.append(bytearray())
+            chunk = data[written:written + self._block_size - start]
+            self._blocks[index][start:start + len(chunk)] = chunk
+            written += len(chunk)
+            self._pos += len(chunk)
+        self._size = max(self._size, self._pos)
+        return written
+    
+    def readinto(self, b):
+        out = memoryview(b).cast('B')
+        n = min(len(out), max(self._size - self._pos, 0))
+        copied = 0
+        while copied < n:
+            index, start = divmod(self._pos, self._block_size)
+            block = self._blocks[index]
+            chunk = min(n - copied, len(block) - start)
+            out[copied:copied + chunk] = block[start:start + chunk]
+            copied += chunk
+            self._pos += chunk
+        return copied
+    
+    def getvalue(self) -> bytes:
+        """Contenido completo (solo aquí se concatenan los bloques)"""
+        return b"".join(self._blocks)
+    
+    def write_to(self, output_file) -> None:
+        """Escribe todo el contenido en output_file bloque a bloque, sin mover la posición"""
+        for block in self._blocks:
+            output_file.write(block)
+
+# PDFs individuales procesados en memoria, pendientes de escribirse a disco
+PENDING_OUTPUTS: dict[str, SegmentedBytesIO] = {}
+# Límites de memoria: las salidas grandes van directas a disco y, si el total
+# pendiente se supera, se vuelcan las más antiguas
+PENDING_OUTPUT_MAX_SIZE = 16 << 20
+PENDING_OUTPUTS_MAX_BYTES = 256 << 20
+# Volcados a disco en curso por file_id: las descargas concurrentes esperan al mismo
+_PENDING_FLUSHES: dict[str, asyncio.Future] = {}
+
+def write_output_file(output_buffer: SegmentedBytesIO, file_path: Path) -> None:
+    """Vuelca un buffer a disco con nombre temporal + os.replace: nunca se ve a medio escribir"""
+    temp_path = file_path.with_name(f"{file_path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(temp_path, "wb") as output_file:
+            output_buffer.write_to(output_file)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+async def flush_pending_output(file_id: str) -> None:
+    """Escribe a disco la salida en memoria de file_id (si la hay) una sola vez"""
+    flush = _PENDING_FLUSHES.get(file_id)
+    if flush is not None:
+        await asyncio.shield(flush)
+        return
+    output_buffer = PENDING_OUTPUTS.get(file_id)
+    if output_buffer is None:
+        return
+    flush = _PENDING_FLUSHES[file_id] = asyncio.ensure_future(
+        asyncio.to_thread(write_output_file, output_buffer, TEMP_DIR / f"{file_id}_output.pdf")
+    )
+    try:
+        await asyncio.shield(flush)
+        # Solo se suelta de memoria cuando el fichero completo ya está en su sitio
+        PENDING_OUTPUTS.pop(file_id, None)
+    finally:
+        _PENDING_FLUSHES.pop(file_id, None)
+
+async def store_pending_output(file_id: str, output_buffer: SegmentedBytesIO) -> None:
+    """Guarda una salida en memoria hasta su descarga, respetando los límites de memoria"""
+    PENDING_OUTPUTS[file_id] = output_buffer
+    to_flush = [file_id] if output_buffer.size > PENDING_OUTPUT_MAX_SIZE else []
+    total = sum(pending.size for pending in PENDING_OUTPUTS.values())
+    # El dict conserva el orden de inserción: primero las más antiguas
+    for pending_id, pending in list(PENDING_OUTPUTS.items()):
+        if total <= PENDING_OUTPUTS_MAX_BYTES:
+            break
+        if pending_id not in to_flush:
+            to_flush.append(pending_id)
+            total -= pending.size
+    for pending_id in to_flush:
+        try:
+            await flush_pending_output(pending_id)
+        except OSError as e:
+            logger.error("Error volcando %s a disco: %s", pending_id, e)
+
+# Overlays de la configuración por defecto para los tamaños de página habituales,
+# generados al iniciar: (config, ancho redondeado, alto redondeado) -> bytes
+PRECOMPUTED_PAGE_SIZES = [
+    (612.0, 792.0),                              # Carta
+    (595.2755905511812, 841.8897637795277),      # A4
+    (612.0, 1008.0)                              # Legal
+]
+PRECOMPUTED_OVERLAYS: dict[tuple, bytes] = {}
+
+# Overlay de una página escrito a mano: catálogo con AcroForm, página, widget,
+# fuente y el texto indicativo. Solo cambian el tamaño, el nombre y el rectángulo
+_OVERLAY_OBJECTS = (
+    b"<</Type/Catalog/Pages 2 0 R/AcroForm<</Fields[4 0 R]/NeedAppearances true>>>>",
+    b"<</Type/Pages/Count 1/Kids[3 0 R]>>",
+    b"<</Type/Page/Parent 2 0 R/MediaBox[0 0 %(width).4f %(height).4f]/Annots[4 0 R]"
+    b"/Resources<</Font<</FImagen 5 0 R>>>>/Contents 6 0 R>>",
+    b"<</Type/Annot/Subtype/Widget/FT/Btn/Ff 65536/T %(title)s/TU %(tooltip)s"
+    b"/Rect[%(x1).4f %(y1).4f %(x2).4f %(y2).4f]/F 4/P 3 0 R/BS<</W 1/S/I>>/MK<</BC[0]/BG[1]>>>>",
+    b"<</Type/Font/Subtype/Type1/BaseFont/Helvetica/Encoding/WinAnsiEncoding>>",
+    b"<</Length %(length)d>>stream\n%(content)sendstream"
+)
+
+# Backend nativo (qpdf) para estampar el overlay, buscado una sola vez al importar
+QPDF_PATH = shutil.which("qpdf")
+
+# Pool de procesos para los batches (el trabajo con PDFs es CPU y retiene el GIL)
+EXECUTOR = ProcessPoolExecutor(max_workers=os.cpu_count())
 
 # Clase principal (adaptada del código original)
 class PDFImageFieldProcessor:
@@ -76,69 +285,513 @@ class PDFImageFieldProcessor:
         self.y_pos = config.y_pos
         self.width = config.width
         self.height = config.height
+        self.config_key = (self.field_name, self.x_pos, self.y_pos, self.width, self.height)
+        # Posiciones negativas cuentan desde el borde opuesto; se decide una sola vez
+        self._x_is_rel = self.x_pos < 0
+        self._y_is_rel = self.y_pos < 0
+        self._rect_cache: dict[tuple, tuple] = {}
+        # Cadenas del widget ya codificadas, iguales para todos los documentos
+        self._field_title = TextStringObject(self.field_name)
+        self._field_tooltip = TextStringObject(f'Campo de imagen: {self.field_name}')
+        # Overlays ya generados por tamaño de página (ancho, alto), y sus ficheros
+        # por (directorio, ancho, alto)
+        self._overlay_cache: dict[tuple, bytes] = {}
+        self._overlay_files: dict[tuple, str] = {}
+        self.native_tool = QPDF_PATH
     
-    def create_image_field_overlay(self, page_width=612, page_height=792):
-        """Crea overlay con campo de imagen"""
+    def create_image_field_overlay(self, page_width=612, page_height=792) -> bytes:
+        """Crea overlay con campo de imagen (PDF de una página montado sobre _OVERLAY_OBJECTS)"""
+        x1, y1, x2, y2 = self.field_rect(page_width, page_height)
+        content = self.field_text("/FImagen", (x1, y1))
+        values = {
+            b"width": page_width, b"height": page_height,
+            b"title": self._encoded_string(self._field_title),
+            b"tooltip": self._encoded_string(self._field_tooltip),
+            b"x1": x1, b"y1": y1, b"x2": x2, b"y2": y2,
+            b"length": len(content), b"content": content
+        }
+        
+        overlay = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, template in enumerate(_OVERLAY_OBJECTS, 1):
+            offsets.append(len(overlay))
+            overlay += b"%d 0 obj\n" % number + template % values + b"\nendobj\n"
+        xref_offset = len(overlay)
+        overlay += b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1)
+        overlay += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        overlay += b"trailer\n<</Size %d/Root 1 0 R>>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref_offset)
+        return bytes(overlay)
+    
+    @staticmethod
+    def _encoded_string(value: TextStringObject) -> bytes:
+        """Serializa una cadena PDF (escapes y UTF-16 si hace falta) como lo haría pypdf"""
         buffer = io.BytesIO()
-        c = canvas.Canvas(buffer, pagesize=(page_width, page_height))
+        value.write_to_stream(buffer)
+        return buffer.getvalue()
+    
+    def field_rect(self, page_width, page_height) -> tuple:
+        """Rectángulo (x1, y1, x2, y2) del campo, calculado una vez por tamaño de página"""
+        key = self.page_size_key(page_width, page_height)
+        rect = self._rect_cache.get(key)
+        if rect is None:
+            x = page_width + self.x_pos if self._x_is_rel else self.x_pos
+            y = page_height + self.y_pos if self._y_is_rel else self.y_pos
+            rect = self._rect_cache[key] = tuple(
+                float(value) for value in (x, y, x + self.width, y + self.height)
+            )
+        return rect
+    
+    @staticmethod
+    def page_size_key(page_width, page_height) -> tuple:
+        """Clave de caché por tamaño de página (centésimas de punto, absorbe el ruido de redondeo)"""
+        return (round(page_width, 2), round(page_height, 2))
+    
+    def get_overlay_bytes(self, page_width=612, page_height=792) -> bytes:
+        """Obtiene el overlay serializado para un tamaño, generándolo una sola vez"""
+        key = self.page_size_key(page_width, page_height)
+        overlay_bytes = self._overlay_cache.get(key)
+        if overlay_bytes is None:
+            overlay_bytes = PRECOMPUTED_OVERLAYS.get((self.config_key, round(page_width), round(page_height)))
+            if overlay_bytes is None:
+                overlay_bytes = self.create_image_field_overlay(page_width, page_height)
+            self._overlay_cache[key] = overlay_bytes
+        return overlay_bytes
+    
+    def create_image_field_manual(self, page_width=612, page_height=792) -> DictionaryObject:
+        """Crea directamente el diccionario del widget del campo de imagen"""
+        return DictionaryObject({
+            NameObject("/Type"): NameObject("/Annot"),
+            NameObject("/Subtype"): NameObject("/Widget"),
+            NameObject("/FT"): NameObject("/Btn"),
+            NameObject("/Ff"): NumberObject(1 << 16),  # Botón pulsador (campo de imagen)
+            NameObject("/T"): self._field_title,
+            NameObject("/TU"): self._field_tooltip,
+            NameObject("/Rect"): ArrayObject(FloatObject(value) for value in self.field_rect(page_width, page_height)),
+            NameObject("/F"): NumberObject(4),
+            NameObject("/BS"): DictionaryObject({
+                NameObject("/W"): NumberObject(1),
+                NameObject("/S"): NameObject("/I")
+            }),
+            NameObject("/MK"): DictionaryObject({
+                NameObject("/BC"): ArrayObject([FloatObject(0)]),
+                NameObject("/BG"): ArrayObject([FloatObject(1)])
+            })
+        })
+    
+    def add_image_field(self, writer: PdfWriter, page) -> IndirectObject:
+        """
+        Añade a la página el widget y el texto indicativo sin tocar su contenido original.
+        Devuelve la referencia al widget.
+        """
+        page_rect = page.mediabox
+        field_dict = self.create_image_field_manual(float(page_rect.width), float(page_rect.height))
+        field_dict[NameObject("/P")] = page.indirect_reference
+        field_ref = writer._add_object(field_dict)
+        annotations = page.setdefault(NameObject("/Annots"), ArrayObject()).get_object()
+        annotations.append(field_ref)
         
-        # Ajustar posición
-        adjusted_x = self.x_pos if self.x_pos >= 0 else page_width + self.x_pos
-        adjusted_y = self.y_pos if self.y_pos >= 0 else page_height + self.y_pos
+        # Fuente Helvetica para el texto, con un nombre libre en los recursos de la página
+        resources = page.setdefault(NameObject("/Resources"), DictionaryObject()).get_object()
+        fonts = resources.setdefault(NameObject("/Font"), DictionaryObject()).get_object()
+        font_name = "/FImagen"
+        while font_name in fonts:
+            font_name += "_"
+        fonts[NameObject(font_name)] = writer._add_object(DictionaryObject({
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+            NameObject("/Encoding"): NameObject("/WinAnsiEncoding")
+        }))
         
-        # Crear campo de imagen
-        c.acroForm.button(
-            name=self.field_name,
-            tooltip=f'Campo de imagen: {self.field_name}',
-            x=adjusted_x,
-            y=adjusted_y,
-            width=self.width,
-            height=self.height,
-            borderStyle='inset',
-            borderWidth=1,
-            fillColor=white,
-            borderColor=black,
-            forceBorder=True
-        )
+        # El contenido original queda entre q/Q sin decodificarse; el texto va en un stream aparte
+        contents = ArrayObject([self._add_stream(writer, b"q\n")])
+        original = page.get("/Contents")
+        if original is not None:
+            if isinstance(original.get_object(), ArrayObject):
+                contents.extend(original.get_object())
+            elif isinstance(original, IndirectObject):
+                contents.append(original)
+            else:
+                contents.append(writer._add_object(original))
+        contents.append(self._add_stream(writer, self.field_label(font_name, field_dict["/Rect"])))
+        page[NameObject("/Contents")] = contents
+        return field_ref
+    
+    def field_text(self, font_name: str, rect) -> bytes:
+        """Operadores que dibujan el texto indicativo junto al campo"""
+        text_x = rect[0] + 5
+        text_y = rect[1] + (self.height/2) - 4
+        return f"q BT {font_name} 8 Tf 0 g {text_x:.2f} {text_y:.2f} Td (Imagen) Tj ET Q\n".encode("latin-1")
+    
+    def field_label(self, font_name: str, rect) -> bytes:
+        """Stream con el texto indicativo; cierra antes el q que aísla el contenido original"""
+        return b"\nQ\n" + self.field_text(font_name, rect)
+    
+    def add_image_field_pikepdf(self, pdf, page):
+        """Equivalente de add_image_field + register_form_field sobre un documento pikepdf; devuelve el widget"""
+        page_rect = pikepdf.Rectangle(page.mediabox)
+        rect = self.field_rect(page_rect.width, page_rect.height)
+        widget = pdf.make_indirect(pikepdf.Dictionary(
+            Type=pikepdf.Name.Annot,
+            Subtype=pikepdf.Name.Widget,
+            FT=pikepdf.Name.Btn,
+            Ff=1 << 16,  # Botón pulsador (campo de imagen)
+            T=pikepdf.String(self.field_name),
+            TU=pikepdf.String(f'Campo de imagen: {self.field_name}'),
+            Rect=pikepdf.Array(rect),
+            F=4,
+            BS=pikepdf.Dictionary(W=1, S=pikepdf.Name.I),
+            MK=pikepdf.Dictionary(BC=[0], BG=[1]),
+            P=page.obj
+        ))
+        if pikepdf.Name.Annots not in page.obj:
+            page.obj.Annots = pikepdf.Array()
+        page.obj.Annots.append(widget)
         
-        # Texto indicativo
-        c.setFont("Helvetica", 8)
-        c.setFillColor(black)
-        text_x = adjusted_x + 5
-        text_y = adjusted_y + (self.height/2) - 4
-        c.drawString(text_x, text_y, "Imagen")
+        # Copias propias de /Resources y /Font: pueden estar compartidos con otras páginas
+        resources = pikepdf.Dictionary(page.resources)
+        fonts = pikepdf.Dictionary(resources.get(pikepdf.Name.Font, pikepdf.Dictionary()))
+        font_name = "/FImagen"
+        while font_name in fonts:
+            font_name += "_"
+        fonts[font_name] = pdf.make_indirect(pikepdf.Dictionary(
+            Type=pikepdf.Name.Font,
+            Subtype=pikepdf.Name.Type1,
+            BaseFont=pikepdf.Name.Helvetica,
+            Encoding=pikepdf.Name.WinAnsiEncoding
+        ))
+        resources.Font = fonts
+        page.obj.Resources = resources
+        page.contents_add(pikepdf.Stream(pdf, b"q\n"), prepend=True)
+        page.contents_add(pikepdf.Stream(pdf, self.field_label(font_name, rect)))
         
-        c.save()
-        buffer.seek(0)
-        return buffer
+        if pikepdf.Name.AcroForm not in pdf.Root:
+            pdf.Root.AcroForm = pdf.make_indirect(pikepdf.Dictionary())
+        acroform = pdf.Root.AcroForm
+        if pikepdf.Name.Fields not in acroform:
+            acroform.Fields = pikepdf.Array()
+        acroform.Fields.append(widget)
+        acroform.NeedAppearances = True
+        return widget
+    
+    @staticmethod
+    def _add_stream(writer: PdfWriter, data: bytes) -> IndirectObject:
+        stream = DecodedStreamObject()
+        stream.set_data(data)
+        return writer._add_object(stream)
+    
+    @staticmethod
+    def first_page_size(reader: PdfReader) -> tuple:
+        """
+        Tamaño (ancho, alto) de la primera página bajando solo por el primer hijo
+        del árbol de páginas, sin cargar el resto (reader.pages lo recorre entero)
+        """
+        try:
+            node = reader.trailer["/Root"]["/Pages"].get_object()
+            mediabox = node.get("/MediaBox")
+            while "/Kids" in node:
+                # Se saltan los nodos /Pages vacíos (/Count 0)
+                node = next(
+                    kid for kid in (ref.get_object() for ref in node["/Kids"])
+                    if kid.get("/Count", 1) != 0
+                )
+                mediabox = node.get("/MediaBox", mediabox)
+            x1, y1, x2, y2 = (float(value) for value in mediabox)
+        except (KeyError, IndexError, StopIteration, TypeError, ValueError):
+            x1, y1, x2, y2 = (float(value) for value in reader.pages[0].mediabox)
+        return x2 - x1, y2 - y1
+    
+    def get_overlay_file(self, input_path: str, directory) -> str:
+        """Escribe (una vez por tamaño) el overlay adecuado para input_path en directory"""
+        with mapped_input(input_path) as source:
+            key = self.page_size_key(*self.first_page_size(PdfReader(source)))
+        file_key = (str(directory), *key)
+        overlay_path = self._overlay_files.get(file_key)
+        if overlay_path is None:
+            overlay_path = os.path.join(file_key[0], f"overlay_{key[0]:g}x{key[1]:g}.pdf")
+            with open(overlay_path, 'wb') as overlay_file:
+                overlay_file.write(self.get_overlay_bytes(*key))
+            self._overlay_files[file_key] = overlay_path
+        return overlay_path
+    
+    def release_overlay_files(self, directory: Path) -> None:
+        """Olvida los overlays escritos en directory (se va a borrar)"""
+        directory = str(directory)
+        # Copia de las claves: get_overlay_file puede insertar a la vez desde otros hilos
+        for file_key in list(self._overlay_files):
+            if file_key[0] == directory:
+                self._overlay_files.pop(file_key, None)
+    
+    def process_pdf_native(self, input_path: str, output_path, overlay_path: str) -> bool:
+        """
+        Procesa un PDF estampando el overlay con qpdf (solo primera página).
+        output_path puede ser una ruta o un stream binario.
+        """
+        try:
+            if not _quick_validate(input_path):
+                logger.error("PDF no válido (sin cabecera %%PDF- o sin startxref/%%%%EOF): %s", input_path)
+                return False
+        except OSError as e:
+            logger.error("Error leyendo %s: %s", input_path, e)
+            return False
+        to_stream = not isinstance(output_path, (str, Path))
+        try:
+            result = subprocess.run(
+                # --decode-level=none: copiar los streams existentes sin descomprimir ni recomprimir
+                [self.native_tool, input_path, "--warning-exit-0", "--decode-level=none",
+                 "--overlay", overlay_path, "--to=1", "--", "-" if to_stream else str(output_path)],
+                check=True,
+                capture_output=True
+            )
+            if to_stream:
+                output_path.write(result.stdout)
+            return True
+        except subprocess.CalledProcessError as e:
+            logger.error("qpdf terminó con código %s: %s", e.returncode, e.stderr.decode(errors="replace").strip())
+            return False
+        except OSError as e:
+            logger.error("Error ejecutando qpdf: %s", e)
+            return False
+        except Exception:
+            logger.exception("Error procesando PDF con qpdf")
+            return False
     
-    def process_pdf(self, input_path: str, output_path: str) -> bool:
-        """Procesa un PDF individual"""
+    def register_form_field(self, writer: PdfWriter, field_ref: IndirectObject) -> None:
+        """Registra el widget en /AcroForm /Fields del documento"""
+        acroform = writer._root_object.setdefault(NameObject("/AcroForm"), DictionaryObject()).get_object()
+        fields = acroform.setdefault(NameObject("/Fields"), ArrayObject()).get_object()
+        fields.append(field_ref)
+        acroform[NameObject("/NeedAppearances")] = BooleanObject(True)
+    
+    def process_pdf(self, input_path, output_path) -> bool:
+        """
+        Procesa un PDF individual.
+        input_path y output_path pueden ser rutas o streams binarios.
+        """
         try:
-            with open(input_path, 'rb') as file:
-                reader = PdfReader(file)
-                writer = PdfWriter()
+            # Los ficheros dañados se descartan sin llegar a construir el lector
+            if not _quick_validate(input_path):
+                logger.error("PDF no válido (sin cabecera %PDF- o sin startxref/%%EOF)")
+                return False
+            if pikepdf is not None:
+                # qpdf lee las rutas por su cuenta, sin pasar por objetos de fichero de Python
+                with pikepdf.open(input_path) as pdf:
+                    self.add_image_field_pikepdf(pdf, pdf.pages[0])
+                    pdf.save(
+                        output_path,
+                        linearize=False,
+                        object_stream_mode=pikepdf.ObjectStreamMode.preserve,
+                        # Solo se añade un widget: los streams existentes se copian tal cual
+                        stream_decode_level=pikepdf.StreamDecodeLevel.none
+                    )
+                return True
+            
+            with mapped_input(input_path) as source:
+                # Actualización incremental: se copian los bytes originales y solo se
+                # añaden al final los objetos modificados (página 0, widget, AcroForm)
+                reader = PdfReader(source)
+                writer = PdfWriter(reader, incremental=True)
+                page = writer.pages[0]
                 
-                for page_num, page in enumerate(reader.pages):
-                    page_rect = page.mediabox
-                    page_width = float(page_rect.width)
-                    page_height = float(page_rect.height)
-                    
-                    if page_num == 0:  # Solo primera página
-                        overlay_buffer = self.create_image_field_overlay(page_width, page_height)
-                        overlay_reader = PdfReader(overlay_buffer)
-                        overlay_page = overlay_reader.pages[0]
-                        page.merge_page(overlay_page)
-                    
-                    writer.add_page(page)
+                self.register_form_field(writer, self.add_image_field(writer, page))
                 
-                with open(output_path, 'wb') as output_file:
-                    writer.write(output_file)
+                write_output(writer, output_path)
             
             return True
-        except Exception as e:
-            print(f"Error procesando PDF: {e}")
+        except PDF_ERRORS as e:
+            logger.error("Error procesando PDF: %s", e)
+            return False
+        except Exception:
+            logger.exception("Error procesando PDF")
             return False
+    
+    def process_pdfs_combined(self, input_paths: list, output_path: str) -> int:
+        """
+        Une varios PDFs en un único documento, con un campo (nombre_N) en la
+        primera página de cada uno, y lo escribe una sola vez.
+        Devuelve cuántos documentos se añadieron.
+        """
+        valid_paths = []
+        for input_path in input_paths:
+            try:
+                valid = _quick_validate(input_path)
+            except OSError as e:
+                logger.error("Error leyendo %s: %s", input_path, e)
+                continue
+            if valid:
+                valid_paths.append(input_path)
+            else:
+                logger.error("PDF no válido (sin cabecera %%PDF- o sin startxref/%%%%EOF): %s", input_path)
+        input_paths = valid_paths
+        
+        added = 0
+        if pikepdf is not None:
+            # Los originales deben seguir abiertos hasta guardar: sus streams se copian al
+            # escribir. Se abren desde memoria para no retener un descriptor por documento
+            with ExitStack() as stack:
+                combined = stack.enter_context(pikepdf.new())
+                fields = []
+                for input_path in input_paths:
+                    try:
+                        source = stack.enter_context(pikepdf.open(io.BytesIO(Path(input_path).read_bytes())))
+                        widget = self.add_image_field_pikepdf(source, source.pages[0])
+                        widget.T = pikepdf.String(f"{self.field_name}_{added + 1}")
+                        if hasattr(combined, "add_pages_from"):
+                            # Conserva los campos del formulario original junto al nuevo
+                            combined.add_pages_from(source)
+                        else:
+                            combined.pages.extend(source.pages)
+                            fields.extend(combined.copy_foreign(field) for field in source.Root.AcroForm.Fields)
+                        added += 1
+                    except PDF_ERRORS as e:
+                        logger.error("Error procesando %s: %s", input_path, e)
+                    except Exception:
+                        logger.exception("Error procesando %s", input_path)
+                if added:
+                    if fields:
+                        combined.Root.AcroForm = combined.make_indirect(
+                            pikepdf.Dictionary(Fields=pikepdf.Array(fields))
+                        )
+                    combined.Root.AcroForm.NeedAppearances = True
+                    try:
+                        combined.save(
+                            output_path,
+                            linearize=False,
+                            object_stream_mode=pikepdf.ObjectStreamMode.generate
+                        )
+                    except PDF_ERRORS as e:
+                        logger.error("Error guardando el PDF combinado: %s", e)
+                        Path(output_path).unlink(missing_ok=True)
+                        return 0
+            return added
+        
+        writer = PdfWriter()
+        for input_path in input_paths:
+            try:
+                with mapped_input(input_path) as source:
+                    first_page = len(writer.pages)
+                    writer.append(PdfReader(source))
+                field_ref = self.add_image_field(writer, writer.pages[first_page])
+                field_ref.get_object()[NameObject("/T")] = TextStringObject(f"{self.field_name}_{added + 1}")
+                self.register_form_field(writer, field_ref)
+                added += 1
+            except PDF_ERRORS as e:
+                logger.error("Error procesando %s: %s", input_path, e)
+            except Exception:
+                logger.exception("Error procesando %s", input_path)
+        if added:
+            try:
+                write_output(writer, output_path)
+            except PDF_ERRORS as e:
+                logger.error("Error guardando el PDF combinado: %s", e)
+                Path(output_path).unlink(missing_ok=True)
+                return 0
+        return added
+
+def write_output(writer: PdfWriter, output_path) -> None:
+    """
+    Escribe el documento. pypdf abre las rutas sin buffer (FileIO) y hace una
+    escritura por objeto; aquí pasan por un buffer grande
+    """
+    if isinstance(output_path, (str, Path)):
+        with open(output_path, "wb", buffering=OUTPUT_BUFFER_SIZE) as output_file:
+            writer.write(output_file)
+    else:
+        writer.write(output_path)
+
+@contextmanager
+def mapped_input(source):
+    """Mapea en memoria las entradas en disco; los streams se devuelven tal cual"""
+    if not isinstance(source, (str, Path)):
+        yield source
+        return
+    with open(source, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        yield mm
+
+# Zona de los extremos del fichero donde deben estar %PDF- y startxref/%%EOF
+QUICK_VALIDATE_SIZE = 1024
+
+def _quick_validate(input_path) -> bool:
+    """Comprueba la cabecera y el final (startxref, %%EOF) sin parsear el documento"""
+    try:
+        with mapped_input(input_path) as source:
+            if isinstance(source, mmap.mmap):
+                head = source[:QUICK_VALIDATE_SIZE]
+                tail = source[-QUICK_VALIDATE_SIZE:]
+            else:
+                position = source.tell()
+                source.seek(0)
+                head = source.read(QUICK_VALIDATE_SIZE)
+                size = source.seek(0, io.SEEK_END)
+                source.seek(max(0, size - QUICK_VALIDATE_SIZE))
+                tail = source.read(QUICK_VALIDATE_SIZE)
+                source.seek(position)
+    except ValueError:
+        # mmap no admite ficheros vacíos
+        return False
+    return b"%PDF-" in head and b"startxref" in tail and b"%%EOF" in tail
+
+# Procesador de la configuración por defecto, creado una sola vez
+_DEFAULT_CONFIG = ImageFieldConfig()
+_DEFAULT_PROCESSOR = PDFImageFieldProcessor(_DEFAULT_CONFIG)
+
+# Procesadores reutilizados (en la API y en cada proceso del pool) entre
+# peticiones con la misma configuración
+_PROCESSORS: dict[tuple, PDFImageFieldProcessor] = {}
+_PROCESSORS_MAX = 32
+
+def get_processor(config: ImageFieldConfig) -> PDFImageFieldProcessor:
+    """Devuelve el procesador de la configuración, creándolo solo la primera vez"""
+    if config == _DEFAULT_CONFIG:
+        return _DEFAULT_PROCESSOR
+    key = tuple(config)
+    processor = _PROCESSORS.get(key)
+    if processor is None:
+        if len(_PROCESSORS) >= _PROCESSORS_MAX:
+            _PROCESSORS.clear()
+        processor = _PROCESSORS[key] = PDFImageFieldProcessor(config)
+    return processor
+
+def _process_pdf_task(task) -> Optional[bytes]:
+    """Procesa un PDF dentro de un proceso del pool y devuelve su contenido (None si falla)"""
+    config, input_path, overlay_path = task
+    processor = get_processor(config)
+    output_buffer = SegmentedBytesIO()
+    if processor.native_tool:
+        success = processor.process_pdf_native(input_path, output_buffer, overlay_path)
+    else:
+        success = processor.process_pdf(input_path, output_buffer)
+    return output_buffer.getvalue() if success else None
+
+def _process_pdf_chunk(config, items) -> list:
+    """Procesa en un solo viaje al pool varios (nombre, entrada, overlay) con la misma configuración"""
+    return [
+        (filename, _process_pdf_task((config, input_path, overlay_path)))
+        for filename, input_path, overlay_path in items
+    ]
+
+# Máximo de uploads guardándose a la vez (cada uno mantiene un fichero abierto)
+COPY_CONCURRENCY = 32
+_COPY_SEMAPHORE = asyncio.Semaphore(COPY_CONCURRENCY)
+
+async def save_upload(file: UploadFile, path: str) -> None:
+    """Guarda un upload en disco por bloques sin bloquear el event loop"""
+    async with _COPY_SEMAPHORE:
+        with open(path, "wb") as buffer:
+            while chunk := await file.read(COPY_CHUNK_SIZE):
+                await asyncio.to_thread(buffer.write, chunk)
+
+async def save_batch_upload(file: UploadFile, filename: str, input_path: str) -> tuple:
+    """Guarda un upload del batch; devuelve (nombre, ruta, error) sin lanzar"""
+    try:
+        await save_upload(file, input_path)
+        return filename, input_path, None
+    except Exception as e:
+        return filename, input_path, e
+
+def safe_filename(filename: str, index: int) -> str:
+    """Nombre del upload sin directorios (ni / ni \\); si queda vacío se genera uno"""
+    return os.path.basename(filename.replace("\\", "/")) or f"documento_{index}.pdf"
 
 # Endpoints de la API
 
@@ -184,20 +837,30 @@ async def process_single_pdf(
         height=height
     )
     
-    # Generar ID único para el archivo
-    file_id = str(uuid.uuid4())
+    processor = get_processor(config)
     
     try:
-        # Guardar archivo temporal
-        input_path = TEMP_DIR / f"{file_id}_input.pdf"
-        output_path = TEMP_DIR / f"{file_id}_output.pdf"
-        
-        with open(input_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # ID derivado del contenido y la configuración: un PDF ya procesado
+        # con la misma configuración se sirve sin volver a procesarlo.
+        # La configuración es la clave de BLAKE2 (máximo 64 bytes; si no cabe, su resumen)
+        key = repr(processor.config_key).encode("utf-8")
+        if len(key) > hashlib.blake2b.MAX_KEY_SIZE:
+            key = hashlib.blake2b(key).digest()
+        hasher = hashlib.blake2b(key=key, digest_size=16)
+        while chunk := await file.read(COPY_CHUNK_SIZE):
+            hasher.update(chunk)
+        await file.seek(0)
+        file_id = hasher.hexdigest()
         
-        # Procesar PDF
-        processor = PDFImageFieldProcessor(config)
-        success = processor.process_pdf(str(input_path), str(output_path))
+        if file_id in PENDING_OUTPUTS or (TEMP_DIR / f"{file_id}_output.pdf").exists():
+            success = True
+        else:
+            # Procesar directamente desde el upload; la salida queda en memoria
+            # hasta que se descargue
+            output_buffer = SegmentedBytesIO()
+            success = await asyncio.to_thread(processor.process_pdf, file.file, output_buffer)
+            if success:
+                await store_pending_output(file_id, output_buffer)
         
         if success:
             return ProcessResponse(
@@ -214,27 +877,28 @@ async def process_single_pdf(
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
-    
-    finally:
-        # Limpiar archivo de entrada
-        if input_path.exists():
-            input_path.unlink()
 
 @app.post("/process-multiple-pdfs", response_model=ProcessResponse)
 async def process_multiple_pdfs(
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     field_name: str = Form("firma_empleado"),
     x_pos: int = Form(-27),
     y_pos: int = Form(16),
     width: int = Form(90),
-    height: int = Form(23)
+    height: int = Form(23),
+    mode: str = Form("per-file")
 ):
     """
-    Procesa múltiples archivos PDF y los devuelve en un ZIP
+    Procesa múltiples archivos PDF y los devuelve en un ZIP (mode="per-file")
+    o unidos en un único PDF (mode="combined")
     """
     if not files:
         raise HTTPException(status_code=400, detail="No se proporcionaron archivos")
     
+    if mode not in ("per-file", "combined"):
+        raise HTTPException(status_code=400, detail=f"Modo no válido: {mode}")
+    
     # Verificar que todos sean PDFs
     for file in files:
         if not file.filename.lower().endswith('.pdf'):
@@ -252,65 +916,122 @@ async def process_multiple_pdfs(
     # Generar ID único para el batch
     batch_id = str(uuid.uuid4())
     batch_dir = TEMP_DIR / f"batch_{batch_id}"
-    batch_dir.mkdir()
+    batch_dir.mkdir(exist_ok=True)
     
-    processor = PDFImageFieldProcessor(config)
+    processor = get_processor(config)
     successful = 0
     failed = 0
     
     try:
-        # Procesar cada archivo
-        for file in files:
-            try:
-                input_path = batch_dir / f"input_{file.filename}"
-                output_path = batch_dir / f"processed_{file.filename}"
-                
-                # Guardar archivo temporal
-                with open(input_path, "wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
-                
-                # Procesar
-                if processor.process_pdf(str(input_path), str(output_path)):
-                    successful += 1
-                else:
-                    failed += 1
-                
-                # Limpiar entrada
-                input_path.unlink()
-                
-            except Exception as e:
-                print(f"Error procesando {file.filename}: {e}")
+        # Procesar en paralelo en el pool de procesos, en lotes (~4 por proceso)
+        # para no pagar un viaje de ida y vuelta por archivo. Los archivos se
+        # guardan de forma concurrente y cada lote se envía al pool en cuanto
+        # está completo, sin esperar al resto de subidas
+        loop = asyncio.get_running_loop()
+        chunk_size = max(1, len(files) // (4 * (os.cpu_count() or 1)))
+        futures = []
+        chunk = []
+        submitted = 0
+        combined_inputs = set()
+        # Rutas de entrada calculadas una sola vez, como str (se envían al pool);
+        # el índice evita que dos uploads con el mismo nombre compartan fichero.
+        # Los nombres del cliente se reducen a su basename: se usan en disco y en el ZIP
+        batch_dir_path = str(batch_dir)
+        filenames = [safe_filename(file.filename, index) for index, file in enumerate(files)]
+        input_paths = [
+            os.path.join(batch_dir_path, f"input_{index}_{filename}") for index, filename in enumerate(filenames)
+        ]
+        for saved in asyncio.as_completed(
+            [save_batch_upload(*upload) for upload in zip(files, filenames, input_paths)]
+        ):
+            filename, input_path, error = await saved
+            if error is None and mode == "combined":
+                combined_inputs.add(input_path)
+                continue
+            if error is None:
+                try:
+                    # Con qpdf: un overlay en disco por tamaño de página, reutilizado por todo el batch
+                    overlay_path = None
+                    if processor.native_tool:
+                        overlay_path = await asyncio.to_thread(processor.get_overlay_file, input_path, batch_dir_path)
+                    chunk.append((filename, input_path, overlay_path))
+                except Exception as e:
+                    error = e
+            if error is not None:
+                logger.error("Error procesando %s: %s", filename, error)
                 failed += 1
+            if len(chunk) == chunk_size:
+                futures.append(loop.run_in_executor(EXECUTOR, _process_pdf_chunk, config, chunk))
+                submitted += len(chunk)
+                chunk = []
+        if chunk:
+            futures.append(loop.run_in_executor(EXECUTOR, _process_pdf_chunk, config, chunk))
+            submitted += len(chunk)
         
-        if successful > 0:
-            # Crear ZIP con archivos procesados
-            zip_path = TEMP_DIR / f"processed_pdfs_{batch_id}.zip"
-            
-            with zipfile.ZipFile(zip_path, 'w') as zip_file:
-                for processed_file in batch_dir.glob("processed_*"):
-                    original_name = processed_file.name.replace("processed_", "")
-                    zip_file.write(processed_file, original_name)
+        zip_path = TEMP_DIR / f"processed_pdfs_{batch_id}.zip"
+        if mode == "combined":
+            # Un único PDF con todos los documentos, en el orden de subida, escrito una sola vez
+            input_paths = [input_path for input_path in input_paths if input_path in combined_inputs]
+            output_path = TEMP_DIR / f"{batch_id}_output.pdf"
+            successful = await asyncio.to_thread(processor.process_pdfs_combined, input_paths, str(output_path))
+            failed += len(input_paths) - successful
+            download_url = f"/download/{batch_id}"
+        else:
+            # Progreso en una línea compacta cada ~1% de los archivos
+            progress_step = max(1, submitted // 100)
+            next_progress = progress_step
+            done = 0
             
+            # Cada lote se añade al ZIP (sin recomprimir, los PDFs ya van
+            # comprimidos) en cuanto termina; los nombres repetidos se numeran
+            entry_names = set()
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zip_file:
+                for next_chunk in asyncio.as_completed(futures):
+                    for filename, pdf_bytes in await next_chunk:
+                        if pdf_bytes is None:
+                            failed += 1
+                        else:
+                            entry_name = filename
+                            stem, suffix = os.path.splitext(filename)
+                            copy = 1
+                            while entry_name in entry_names:
+                                entry_name = f"{stem}_{copy}{suffix}"
+                                copy += 1
+                            entry_names.add(entry_name)
+                            await asyncio.to_thread(zip_file.writestr, entry_name, pdf_bytes)
+                            successful += 1
+                        done += 1
+                        if done >= next_progress or done == submitted:
+                            next_progress += progress_step
+                            if logger.isEnabledFor(logging.INFO):
+                                percent = done * 100 // submitted
+                                bar = "#" * (percent // 5) + " " * (20 - percent // 5)
+                                logger.info("Procesando: %d%% |%s| %d/%d", percent, bar, done, submitted)
+            download_url = f"/download-zip/{batch_id}"
+        
+        if successful > 0:
+            # El directorio batch solo tiene entradas y overlays: se borra
+            # completo tras enviar la respuesta
+            background_tasks.add_task(shutil.rmtree, batch_dir, ignore_errors=True)
             return ProcessResponse(
                 success=True,
                 message=f"Procesados {successful} de {len(files)} archivos",
                 processed_files=len(files),
                 successful=successful,
                 failed=failed,
-                download_url=f"/download-zip/{batch_id}",
+                download_url=download_url,
                 file_id=batch_id
             )
         else:
+            zip_path.unlink(missing_ok=True)
             raise HTTPException(status_code=500, detail="No se pudo procesar ningún archivo")
             
     except Exception as e:
+        # Las tareas en segundo plano no se ejecutan en respuestas de error
+        shutil.rmtree(batch_dir, ignore_errors=True)
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
-    
     finally:
-        # Limpiar directorio batch (excepto archivos finales)
-        for file in batch_dir.glob("input_*"):
-            if file.exists():
-                file.unlink()
+        processor.release_overlay_files(batch_dir)
 
 @app.get("/download/{file_id}")
 async def download_processed_pdf(file_id: str):
@@ -319,13 +1040,20 @@ async def download_processed_pdf(file_id: str):
     """
     file_path = TEMP_DIR / f"{file_id}_output.pdf"
     
-    if not file_path.exists():
+    # Escribir a disco la salida en memoria en la primera descarga
+    await flush_pending_output(file_id)
+    
+    # Un solo stat: comprueba existencia y se reutiliza en la respuesta
+    try:
+        stat_result = file_path.stat()
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
     
     return FileResponse(
-        path=file_path,
+        path=str(file_path),
         filename=f"pdf_con_imagen_{file_id}.pdf",
-        media_type="application/pdf"
+        media_type="application/pdf",
+        stat_result=stat_result
     )
 
 @app.get("/download-zip/{batch_id}")
@@ -335,13 +1063,18 @@ async def download_processed_zip(batch_id: str):
     """
     zip_path = TEMP_DIR / f"processed_pdfs_{batch_id}.zip"
     
-    if not zip_path.exists():
+    try:
+        stat_result = zip_path.stat()
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Archivo ZIP no encontrado")
     
+    # FileResponse ya anuncia Accept-Ranges y responde 206 a peticiones Range,
+    # lo que permite reanudar descargas grandes
     return FileResponse(
-        path=zip_path,
+        path=str(zip_path),
         filename=f"pdfs_con_imagen_{batch_id}.zip",
-        media_type="application/zip"
+        media_type="application/zip",
+        stat_result=stat_result
     )
 
 @app.delete("/cleanup/{file_id}")
@@ -356,6 +1089,8 @@ async def cleanup_files(file_id: str):
     ]
     
     cleaned = 0
+    if PENDING_OUTPUTS.pop(file_id, None) is not None:
+        cleaned += 1
     for file_path in files_to_clean:
         try:
             if file_path.is_file():
@@ -394,18 +1129,34 @@ async def get_default_config():
 async def startup_event():
     """Limpiar archivos temporales al iniciar"""
     if TEMP_DIR.exists():
-        for file in TEMP_DIR.glob("*"):
-            try:
-                if file.is_file():
-                    file.unlink()
-                elif file.is_dir():
-                    shutil.rmtree(file)
-            except Exception:
-                pass
-    print("🚀 API iniciada - Archivos temporales limpiados")
+        # scandir reutiliza el tipo devuelto por el directorio: sin stat por entrada
+        with os.scandir(TEMP_DIR) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.unlink(entry.path)
+                except Exception:
+                    pass
+    
+    # Precalcular overlays de la configuración por defecto
+    for page_width, page_height in PRECOMPUTED_PAGE_SIZES:
+        try:
+            PRECOMPUTED_OVERLAYS[(_DEFAULT_PROCESSOR.config_key, round(page_width), round(page_height))] = \
+                _DEFAULT_PROCESSOR.create_image_field_overlay(page_width, page_height)
+        except Exception as e:
+            logger.error("Error precalculando overlay %sx%s: %s", page_width, page_height, e)
+    logger.info("🚀 API iniciada - Archivos temporales limpiados")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Detener el pool de procesos"""
+    EXECUTOR.shutdown(wait=True)
 
 if __name__ == "__main__":
     import uvicorn
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     print("🖼️  Iniciando API REST para campos de imagen en PDF")
     print("📡 Documentación disponible en: http://localhost:8000/docs")
     print("🔗 API disponible en: http://localhost:8000")